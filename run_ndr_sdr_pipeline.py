@@ -1,18 +1,27 @@
 """Run SDR and NDR models on large spatial footprint."""
 from datetime import datetime
 import argparse
-import collections
+import ast
+import concurrent.futures
 import configparser
+import functools
 import glob
-import gzip
-import itertools
+import hashlib
+import io
 import logging
+import math
+import mmap
 import multiprocessing
 import os
+import queue
+import re
 import shutil
 import sys
+import tarfile
 import threading
 import time
+import xml.etree.ElementTree as ElementTree
+import zipfile
 
 from inspring import sdr_c_factor
 from inspring import ndr_mfd_plus
@@ -22,10 +31,50 @@ from osgeo import gdal
 from osgeo import ogr
 from osgeo import osr
 import ecoshard
+import numpy
 import requests
 
-
-gdal.SetCacheMax(2**26)
+try:
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+try:
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+try:
+    import pyogrio
+    import shapely
+except ImportError:
+    pyogrio = None
+    shapely = None
+
+# bounds of the per process GDAL block cache
+MIN_GDAL_CACHEMAX = 2**26
+MAX_GDAL_CACHEMAX = 4*2**30
+# GDAL honors GDAL_CACHEMAX itself if set. Otherwise size the block cache
+# to hold the overlapping DEM/stitch blocks between watersheds, but every
+# taskgraph worker process has its own cache so they split a quarter of
+# the RAM between them. Without os.sysconf (Windows) use the minimum.
+if 'GDAL_CACHEMAX' not in os.environ:
+    try:
+        _physical_ram = (
+            os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        _physical_ram = 0
+    gdal.SetCacheMax(int(min(
+        MAX_GDAL_CACHEMAX, max(MIN_GDAL_CACHEMAX, (
+            _physical_ram // (4 * (multiprocessing.cpu_count() + 1)))))))
+gdal.SetConfigOption('GDAL_NUM_THREADS', 'ALL_CPUS')
+# don't list sibling files when opening the VRT/GTI mosaics and their tiles
+gdal.SetConfigOption('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR')
+# keep any masks GDAL creates inside the GeoTIFF rather than in sidecars
+gdal.SetConfigOption('GDAL_TIFF_INTERNAL_MASK', 'YES')
+# cache reads of /vsi* inputs, such as the /vsigzip/ DEM tiles
+gdal.SetConfigOption('VSI_CACHE', 'TRUE')
+gdal.SetConfigOption('VSI_CACHE_SIZE', str(256*2**20))
+# build any overviews with the same block size as the stitch rasters
+gdal.SetConfigOption('GDAL_TIFF_OVR_BLOCKSIZE', '512')
 logging.basicConfig(
     level=logging.DEBUG,
     format=(
@@ -47,60 +96,366 @@ logging.getLogger('inspring.ndr_mfd_plus').setLevel(logging.WARNING)
 LOGGER = logging.getLogger(__name__)
 
 N_TO_BUFFER_STITCH = 10
+# max number of stitch batches a stitch worker may have writing at once
+STITCH_QUEUE_DEPTH = 4
+# max number of stitch workers (and queues) per NDR output raster
+N_STITCH_SHARDS = 4
+# number of rows read/written at a time when stitching into a raster
+STITCH_STRIP_ROWS = 256
+# minimum number of seconds between stitch worker progress logs
+STITCH_LOG_INTERVAL = 1.0
+# seconds between checks for a finished NDR job when the window is full
+INFLIGHT_JOB_POLL_INTERVAL = 0.5
+# number of workspaces that may be removed concurrently
+WORKSPACE_RMTREE_WORKERS = 4
+# a job is split once it holds more than this many watersheds
+MAX_WATERSHEDS_PER_JOB = 1000
+# buffer sizes for streaming gzip decompression
+GZIP_READ_BUFFER_SIZE = 128*1024
+GZIP_WRITE_BUFFER_SIZE = 1024*1024
+# max number of concurrent url HEAD checks before downloading
+HEAD_PROBE_MAX_CONNECTIONS = 32
+# number of concurrent ranged GETs per download and the size of each write
+PARALLEL_DOWNLOAD_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 1024*1024
+# size of each memory mapped slab passed to a single hash update
+HASH_SLAB_SIZE = 64*1024*1024
+# GDAL 3.9 introduced the GTI (GDAL Tile Index) driver which carries a
+# spatial index, much faster than a VRT over many tiles
+GDAL_HAS_GTI = int(gdal.VersionInfo()) >= 3090000
+# per thread caches of objects GDAL doesn't allow sharing between threads
+_THREAD_LOCAL_STATE = threading.local()
+# warp options and output format used when clipping/warping model inputs
+WARP_GDAL_OPTIONS = [
+    'NUM_THREADS=ALL_CPUS', 'USE_GENERAL_CASE_OPTIMIZATION=YES']
+WARP_RASTER_CREATION_TUPLE = ('GTIFF', (
+    'TILED=YES', 'BIGTIFF=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+    'COMPRESS=LZW', 'NUM_THREADS=ALL_CPUS'))
+
+
+# (config, options) parsed by _parse_non_default_options keyed by
+# (id(config), section), the config is kept so its id can't be reused
+_NON_DEFAULT_OPTIONS_CACHE = {}
 
 
 def _parse_non_default_options(config, section):
-    return set([
-        x for x in config[section]
-        if x not in config._defaults])
+    cache_key = (id(config), section)
+    if cache_key not in _NON_DEFAULT_OPTIONS_CACHE:
+        _NON_DEFAULT_OPTIONS_CACHE[cache_key] = (config, frozenset(
+            x for x in config[section]
+            if x not in config._defaults))
+    return _NON_DEFAULT_OPTIONS_CACHE[cache_key][1]
+
+
+def _scandir_files(dir_path):
+    """Recursively yield the paths of all files under `dir_path`."""
+    with os.scandir(dir_path) as dir_iter:
+        for entry in dir_iter:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scandir_files(entry.path)
+            else:
+                yield entry.path
 
 
 def _flatten_dir(working_dir):
     """Move all files in subdirectory to `working_dir`."""
     all_files = []
-    # itertools lets us skip the first iteration (current dir)
-    for root, _dirs, files in itertools.islice(os.walk(working_dir), 1, None):
-        for filename in files:
-            all_files.append(os.path.join(root, filename))
+    with os.scandir(working_dir) as dir_iter:
+        for entry in dir_iter:
+            if entry.is_dir(follow_symlinks=False):
+                all_files.extend(_scandir_files(entry.path))
+    # subdirectories are on the same filesystem so a rename never copies,
+    # but it silently replaces an existing file so check for collisions
     for filename in all_files:
-        shutil.move(filename, working_dir)
+        target_path = os.path.join(working_dir, os.path.basename(filename))
+        if os.path.exists(target_path):
+            raise ValueError(
+                f'cannot flatten {filename} into {working_dir}, '
+                f'{target_path} already exists')
+        os.rename(filename, target_path)
+
+
+def _zip_member_target_path(member, unpack_dir):
+    """Path ``ZipFile.extract`` writes `member` to under `unpack_dir`.
+
+    Mirrors the sanitizing ``ZipFile`` does: drive letters, empty, ``.``
+    and ``..`` components are dropped.
+    """
+    arcname = member.filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    arcname = os.path.sep.join(
+        x for x in arcname.split(os.path.sep)
+        if x not in ('', os.path.curdir, os.path.pardir))
+    return os.path.join(unpack_dir, arcname)
+
+
+def _parallel_unpack_archive(archive_path, unpack_dir):
+    """Unpack a multi-file archive using all available cores.
+
+    ``.tar.gz`` archives are stream extracted through rapidgzip's parallel
+    decoder if it is installed and ``.zip`` archives have their members
+    inflated concurrently. Any other archive is passed to
+    ``shutil.unpack_archive``.
+
+    Args:
+        archive_path (str): path to archive to unpack.
+        unpack_dir (str): path to directory to unpack into.
+
+    Returns:
+        None
+    """
+    n_workers = multiprocessing.cpu_count()
+    if (archive_path.endswith(('.tar.gz', '.tgz')) and
+            rapidgzip is not None):
+        with rapidgzip.open(
+                archive_path, parallelization=n_workers) as archive_file:
+            with tarfile.open(fileobj=archive_file, mode='r|') as tar:
+                tar.extractall(unpack_dir, filter='data')
+    elif archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path, 'r') as archive:
+            # ZipFile.extract creates missing parent directories without
+            # exist_ok, so make them all here before extracting in parallel
+            file_member_list = []
+            for member in archive.infolist():
+                if member.is_dir():
+                    archive.extract(member, unpack_dir)
+                    continue
+                os.makedirs(os.path.dirname(
+                    _zip_member_target_path(member, unpack_dir)),
+                    exist_ok=True)
+                file_member_list.append(member)
+            with concurrent.futures.ThreadPoolExecutor(n_workers) as executor:
+                # list() so any exception raised by a worker is re-raised
+                list(executor.map(
+                    lambda member: archive.extract(member, unpack_dir),
+                    file_member_list))
+    else:
+        shutil.unpack_archive(archive_path, unpack_dir)
+
+
+def _strip_scanline_block_size(vrt_path):
+    """Remove one-scanline block hints from the sources in `vrt_path`.
+
+    BuildVRT records the block size of each source; stripped tiles report
+    a block of a full row by one line which makes GDAL read one scanline
+    at a time. Dropping the hint lets GDAL use the source's native blocks.
+
+    Args:
+        vrt_path (str): path to VRT to modify in place.
+
+    Returns:
+        None
+    """
+    vrt_tree = ElementTree.parse(vrt_path)
+    modified = False
+    for source_properties in vrt_tree.iter('SourceProperties'):
+        if (source_properties.get('BlockYSize') == '1' and
+                source_properties.get('BlockXSize') ==
+                source_properties.get('RasterXSize')):
+            del source_properties.attrib['BlockXSize']
+            del source_properties.attrib['BlockYSize']
+            modified = True
+    if modified:
+        vrt_tree.write(vrt_path)
 
 
 def _unpack_and_vrt_tiles(
         zip_path, unpack_dir, target_nodata, target_vrt_path):
     """Unzip multi-file of tiles and create VRT.
 
+    Gzipped tiles (``.tif.gz``), whether inside the archive or as the
+    archive itself, are not decompressed to disk but referenced through
+    GDAL's ``/vsigzip/`` filesystem so only the windows that are read get
+    decompressed.
+
     Args:
         zip_path (str): path to zip file of tiles
         unpack_dir (str): path to directory to unpack tiles
-        target_vrt_path (str): desired target path for VRT.
+        target_vrt_path (str): desired target path for VRT. If this path
+            ends in ``.gti.gpkg`` a GTI tile index is built instead.
 
     Returns:
         None
     """
     if not os.path.exists(target_vrt_path):
-        shutil.unpack_archive(zip_path, unpack_dir)
-        _flatten_dir(unpack_dir)
-        base_raster_path_list = glob.glob(os.path.join(unpack_dir, '*.tif'))
-        vrt_options = gdal.BuildVRTOptions(VRTNodata=target_nodata)
-        gdal.BuildVRT(
-            target_vrt_path, base_raster_path_list, options=vrt_options)
+        # a lone .tif.gz is never unpacked so nothing else makes this dir
+        os.makedirs(unpack_dir, exist_ok=True)
+        if zip_path.endswith('.tif.gz'):
+            base_raster_path_list = [
+                f'/vsigzip/{os.path.abspath(zip_path)}']
+        else:
+            _parallel_unpack_archive(zip_path, unpack_dir)
+            _flatten_dir(unpack_dir)
+            base_raster_path_list = []
+            with os.scandir(unpack_dir) as dir_iter:
+                for entry in dir_iter:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith('.tif'):
+                        base_raster_path_list.append(entry.path)
+                    elif entry.name.endswith('.tif.gz'):
+                        base_raster_path_list.append(
+                            f'/vsigzip/{os.path.abspath(entry.path)}')
+        if target_vrt_path.endswith('.gti.gpkg'):
+            tile_index_options = gdal.TileIndexOptions(
+                format='GPKG', writeAbsolutePath=True,
+                noData=target_nodata)
+            gdal.TileIndex(
+                target_vrt_path, base_raster_path_list,
+                options=tile_index_options)
+        else:
+            vrt_options = gdal.BuildVRTOptions(VRTNodata=target_nodata)
+            gdal.BuildVRT(
+                target_vrt_path, base_raster_path_list, options=vrt_options)
+            _strip_scanline_block_size(target_vrt_path)
         target_dem = gdal.OpenEx(target_vrt_path, gdal.OF_RASTER)
         if target_dem is None:
             raise RuntimeError(
                 f"didn't make VRT at {target_vrt_path} on: {zip_path}")
 
 
+def _download_range(url, fd, start_byte, end_byte):
+    """Download the inclusive byte range of `url` into `fd` at that offset.
+
+    Returns:
+        True if the range was written, False if the server did not honor
+        the range request.
+    """
+    with requests.get(
+            url, headers={'Range': f'bytes={start_byte}-{end_byte}'},
+            stream=True) as response:
+        if response.status_code != 206:
+            return False
+        offset = start_byte
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+    if offset != end_byte + 1:
+        raise RuntimeError(
+            f'expected to download bytes {start_byte}-{end_byte} of {url} '
+            f'but stopped at {offset}')
+    return True
+
+
+def _parallel_download(
+        url, target_path, n_workers=PARALLEL_DOWNLOAD_WORKERS):
+    """Download `url` to `target_path` with concurrent ranged GETs.
+
+    Falls back to a single connection ``ecoshard.download_url`` if the
+    server does not advertise or honor byte ranges or if the platform
+    does not support ``os.pwrite``. The file is written to
+    ``target_path + '.part'`` and only renamed to `target_path` once the
+    download succeeds, a failed download removes the partial file.
+
+    Args:
+        url (str): url to download.
+        target_path (str): path to the file to write.
+        n_workers (int): number of concurrent range requests.
+
+    Returns:
+        None
+    """
+    # download next to the target and only move it into place once it is
+    # complete so an interrupted download is never mistaken for a done one
+    part_path = f'{target_path}.part'
+    if os.path.exists(part_path):
+        # left over from a killed run
+        os.remove(part_path)
+    try:
+        _download_to_path(url, part_path, n_workers)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, target_path)
+
+
+def _download_to_path(url, target_path, n_workers):
+    """Download `url` to `target_path`, see ``_parallel_download``."""
+    response = requests.head(url, allow_redirects=True)
+    response.raise_for_status()
+    content_length = int(response.headers.get('Content-Length', 0))
+    if (response.headers.get('Accept-Ranges') != 'bytes' or
+            content_length == 0 or not hasattr(os, 'pwrite')):
+        ecoshard.download_url(url, target_path)
+        return
+
+    range_size = -(-content_length // n_workers)  # ceiling division
+    range_list = [
+        (start_byte, min(start_byte+range_size, content_length)-1)
+        for start_byte in range(0, content_length, range_size)]
+    fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, content_length)
+        with concurrent.futures.ThreadPoolExecutor(n_workers) as executor:
+            range_honored_list = list(executor.map(
+                lambda byte_range: _download_range(url, fd, *byte_range),
+                range_list))
+    finally:
+        os.close(fd)
+    if not all(range_honored_list):
+        LOGGER.warning(
+            f'{url} did not honor range requests, downloading serially')
+        ecoshard.download_url(url, target_path)
+
+
+def _calculate_hash(file_path, hash_algorithm):
+    """Return the hex digest of `file_path` using `hash_algorithm`.
+
+    The file is memory mapped and fed to hashlib in large slabs so the
+    OpenSSL implementation runs without Python level copies; the kernel
+    is asked to read ahead the next slab while the current one is hashed.
+    """
+    hash_object = hashlib.new(hash_algorithm)
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return hash_object.hexdigest()
+    with open(file_path, 'rb') as hash_file, mmap.mmap(
+            hash_file.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+        with memoryview(file_map) as file_view:
+            for offset in range(0, file_size, HASH_SLAB_SIZE):
+                next_offset = offset + HASH_SLAB_SIZE
+                if next_offset < file_size and hasattr(
+                        mmap, 'MADV_WILLNEED'):
+                    file_map.madvise(
+                        mmap.MADV_WILLNEED, next_offset,
+                        min(HASH_SLAB_SIZE, file_size-next_offset))
+                hash_object.update(file_view[offset:next_offset])
+    return hash_object.hexdigest()
+
+
+def _validate_hash(ecoshard_path):
+    """Return True if the hash in `ecoshard_path`'s filename matches.
+
+    Ecoshard filenames are of the form ``name_[algorithm]_[hash].ext``
+    where the hash may be truncated to a prefix of the full digest and
+    ``.ext`` may be several extensions such as ``.tif.gz``.
+    """
+    match = re.match(
+        r'.*_([^_.]+)_([0-9a-f]+)\..+$', os.path.basename(ecoshard_path))
+    if match is None:
+        raise ValueError(f'{ecoshard_path} does not have an ecoshard hash')
+    hash_algorithm, expected_hash = match.groups()
+    if hash_algorithm not in hashlib.algorithms_available:
+        raise ValueError(
+            f'{hash_algorithm} in {ecoshard_path} is not a known hash')
+    return _calculate_hash(ecoshard_path, hash_algorithm).startswith(
+        expected_hash)
+
+
 def _download_and_validate(url, target_path):
     """Download an ecoshard and validate its hash."""
-    ecoshard.download_url(url, target_path)
-    if not ecoshard.validate(target_path):
+    _parallel_download(url, target_path)
+    if not _validate_hash(target_path):
         raise ValueError(f'{target_path} did not validate on its hash')
 
 
 def _download_and_set_nodata(url, nodata, target_path):
     """Download and set nodata value if needed."""
-    ecoshard.download_url(url, target_path)
+    _parallel_download(url, target_path)
     if nodata is not None:
         raster = gdal.OpenEx(target_path, gdal.GA_Update)
         band = raster.GetRasterBand(1)
@@ -128,6 +483,8 @@ def fetch_data(ecoshard_map, data_dir):
         data_dir, multiprocessing.cpu_count(), parallel_mode='thread',
         taskgraph_name='fetch data')
     data_map = {}
+    # (key, url, nodata, target_path) of urls that still need downloading
+    url_to_probe_list = []
     for key, value in ecoshard_map.items():
         if value is None:
             continue
@@ -142,22 +499,37 @@ def fetch_data(ecoshard_map, data_dir):
             if os.path.exists(target_path):
                 LOGGER.info(f'{target_path} exists, so skipping download')
                 continue
-            response = requests.head(url)
-            if response:
-                target_path = os.path.join(data_dir, os.path.basename(url))
-                if not os.path.exists(target_path):
-                    task_graph.add_task(
-                        func=_download_and_set_nodata,
-                        args=(url, nodata, target_path),
-                        target_path_list=[target_path],
-                        task_name=f'download {url}')
-            else:
-                raise ValueError(f'{key}: {url} does not refer to a url')
+            url_to_probe_list.append((key, url, nodata, target_path))
         else:
             if not os.path.exists(url):
                 raise ValueError(
                     f'expected an existing file for {key} at {url} but not found')
             data_map[key] = url
+
+    # probe all the urls concurrently over a shared connection pool
+    response_list = []
+    if url_to_probe_list:
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=HEAD_PROBE_MAX_CONNECTIONS,
+                pool_maxsize=HEAD_PROBE_MAX_CONNECTIONS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            with concurrent.futures.ThreadPoolExecutor(
+                    min(HEAD_PROBE_MAX_CONNECTIONS,
+                        len(url_to_probe_list))) as executor:
+                response_list = list(executor.map(
+                    lambda probe: session.head(probe[1]), url_to_probe_list))
+
+    for (key, url, nodata, target_path), response in zip(
+            url_to_probe_list, response_list):
+        if not response:
+            raise ValueError(f'{key}: {url} does not refer to a url')
+        task_graph.add_task(
+            func=_download_and_set_nodata,
+            args=(url, nodata, target_path),
+            target_path_list=[target_path],
+            task_name=f'download {url}')
     LOGGER.info('waiting for downloads to complete')
     task_graph.close()
     task_graph.join()
@@ -169,11 +541,15 @@ def fetch_data(ecoshard_map, data_dir):
 def _unpack_archive(archive_path, dest_dir):
     """Unpack archive to dest_dir."""
     if archive_path.endswith('.gz'):
-        with gzip.open(archive_path, 'r') as f_in:
-            dest_path = os.path.join(
-                dest_dir, os.path.basename(os.path.splitext(archive_path)[0]))
-            with open(dest_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        dest_path = os.path.join(
+            dest_dir, os.path.basename(os.path.splitext(archive_path)[0]))
+        with io.BufferedReader(
+                gzip.open(archive_path, 'rb'),
+                buffer_size=GZIP_READ_BUFFER_SIZE) as f_in, \
+                io.BufferedWriter(
+                    open(dest_path, 'wb', buffering=0),
+                    buffer_size=GZIP_WRITE_BUFFER_SIZE) as f_out:
+            shutil.copyfileobj(f_in, f_out, length=GZIP_WRITE_BUFFER_SIZE)
     else:
         shutil.unpack_archive(archive_path, dest_dir)
 
@@ -199,7 +575,8 @@ def fetch_and_unpack_data(task_graph, config, scenario_id):
     file_map = fetch_task.get()
     LOGGER.info('downloaded data')
     dem_dir = os.path.splitext(file_map['DEM'])[0]
-    dem_vrt_path = os.path.join(dem_dir, 'dem.vrt')
+    dem_vrt_path = os.path.join(
+        dem_dir, 'dem.gti.gpkg' if GDAL_HAS_GTI else 'dem.vrt')
     LOGGER.info('unpack dem')
     _ = task_graph.add_task(
         func=_unpack_and_vrt_tiles,
@@ -223,6 +600,193 @@ def fetch_and_unpack_data(task_graph, config, scenario_id):
     return file_map
 
 
+def _read_watershed_geometry_stats(watershed_path, watershed_ids=None):
+    """Calculate per feature geometry statistics in bulk.
+
+    Uses pyogrio and shapely if they are installed, otherwise falls back
+    to iterating the features with OGR.
+
+    Args:
+        watershed_path (str): path to watershed vector.
+        watershed_ids (list): if not None, only these FIDs are read.
+
+    Returns:
+        tuple of (fid_array, centroid_x_array, centroid_y_array, area_array,
+        bounds_array) where ``bounds_array`` is an (n, 4) array of
+        min_x, min_y, max_x, max_y per feature.
+    """
+    if pyogrio is not None:
+        _, fid_array, wkb_array, _ = pyogrio.raw.read(
+            watershed_path, columns=[], fids=watershed_ids,
+            return_fids=True)
+        if watershed_ids:
+            # features read by fid come back in the order requested
+            fid_array = numpy.asarray(watershed_ids)
+        geometry_array = shapely.from_wkb(wkb_array)
+        centroid_array = shapely.centroid(geometry_array)
+        return (
+            fid_array, shapely.get_x(centroid_array),
+            shapely.get_y(centroid_array), shapely.area(geometry_array),
+            shapely.bounds(geometry_array))
+
+    # plain OGR geometry methods, the SQLite dialect's spatial functions
+    # need a GDAL built with Spatialite
+    watershed_vector = gdal.OpenEx(watershed_path, gdal.OF_VECTOR)
+    watershed_layer = watershed_vector.GetLayer()
+    if watershed_ids:
+        watershed_layer = [
+            watershed_layer.GetFeature(fid) for fid in watershed_ids]
+    stats_list = []
+    for watershed_feature in watershed_layer:
+        watershed_geom = watershed_feature.GetGeometryRef()
+        watershed_centroid = watershed_geom.Centroid()
+        watershed_envelope = watershed_geom.GetEnvelope()
+        stats_list.append(
+            [watershed_feature.GetFID(), watershed_centroid.GetX(),
+             watershed_centroid.GetY(), watershed_geom.Area()] +
+            [watershed_envelope[i] for i in [0, 2, 1, 3]])
+    watershed_geom = None
+    watershed_feature = None
+    watershed_layer = None
+    watershed_vector = None
+    stats_array = numpy.array(stats_list, dtype=numpy.float64).reshape(-1, 8)
+    return (
+        stats_array[:, 0].astype(numpy.int64), stats_array[:, 1],
+        stats_array[:, 2], stats_array[:, 3], stats_array[:, 4:8])
+
+
+def _index_watershed_jobs(
+        watershed_path, degree_separation, global_bb, watershed_ids=None):
+    """Group the watersheds in `watershed_path` into jobs.
+
+    Watersheds larger than one square degree, or any watershed explicitly
+    listed in `watershed_ids`, get their own job. The rest are binned by
+    the `degree_separation` square and UTM zone their centroid lies in. A
+    square moves on to a new sub batch, for all of its UTM zones, once one
+    of its jobs has more than ``MAX_WATERSHEDS_PER_JOB`` watersheds.
+    Geometry statistics are computed in bulk rather than per OGR feature.
+
+    Args:
+        watershed_path (str): path to watershed vector.
+        degree_separation (int): a blocksize number of degrees to coalasce
+            watershed subsets into.
+        global_bb (list): min_lng, min_lat, max_lng, max_lat bounding box
+            to limit watersheds to be selected from, may be None.
+        watershed_ids (list): if not None, only these FIDs are indexed.
+
+    Returns:
+        dict mapping (job_id, epsg) tuples to (fid_list, bounding_box_array,
+        area) tuples where ``bounding_box_array`` is an (n, 4) array of
+        min_lng, min_lat, max_lng, max_lat per watershed and ``area`` is the
+        total degree area of the job.
+    """
+    watershed_basename = os.path.splitext(
+        os.path.basename(watershed_path))[0]
+    (fid_array, centroid_x_array, centroid_y_array, area_array,
+     bounds_array) = _read_watershed_geometry_stats(
+        watershed_path, watershed_ids)
+
+    # same utm zone definition as geoprocessing.get_utm_zone
+    epsg_array = (
+        numpy.where(centroid_y_array > 0, 32600, 32700) +
+        numpy.floor((centroid_x_array + 180) / 6).astype(numpy.int64) % 60 +
+        1)
+
+    valid_mask = numpy.ones(fid_array.shape, dtype=bool)
+    if global_bb is not None:
+        valid_mask = ~(
+            (bounds_array[:, 0] < global_bb[0]) |
+            (bounds_array[:, 2] > global_bb[2]) |
+            (bounds_array[:, 1] > global_bb[3]) |
+            (bounds_array[:, 3] < global_bb[1]))
+        for watershed_bb in bounds_array[~valid_mask]:
+            LOGGER.warning(
+                f'{watershed_bb.tolist()} is on a dangerous boundary so dropping')
+
+    if watershed_ids:
+        single_candidate_mask = numpy.ones(fid_array.shape, dtype=bool)
+    else:
+        single_candidate_mask = area_array > 1
+    single_mask = valid_mask & single_candidate_mask
+
+    watershed_fid_index = {}
+    # one degree grids or immediates get special treatment
+    for index in numpy.flatnonzero(single_mask):
+        job_id = (
+            f'{watershed_basename}_{fid_array[index]}',
+            int(epsg_array[index]))
+        watershed_fid_index[job_id] = (
+            [int(fid_array[index])], bounds_array[index:index+1],
+            area_array[index])
+
+    candidate_index_array = numpy.flatnonzero(~single_candidate_mask)
+    if candidate_index_array.size == 0:
+        return watershed_fid_index
+
+    # clamp into degree_separation squares
+    xy_bin_array = numpy.floor_divide(
+        numpy.column_stack((
+            centroid_x_array[candidate_index_array],
+            centroid_y_array[candidate_index_array])),
+        degree_separation).astype(numpy.int64) * degree_separation
+
+    # The sub batch counter is shared by every utm zone in a square and a
+    # job only rolls over once it has more than MAX_WATERSHEDS_PER_JOB
+    # watersheds. Watersheds dropped for the boundary still take part in
+    # the rollover check but aren't counted. This follows the feature by
+    # feature batching job ids were originally made with.
+    subbatch_index_map = {}
+    job_size_map = {}
+    subbatch_array = numpy.empty(candidate_index_array.size, numpy.int64)
+    for candidate_index, (x, y, epsg, valid) in enumerate(zip(
+            xy_bin_array[:, 0].tolist(), xy_bin_array[:, 1].tolist(),
+            epsg_array[candidate_index_array].tolist(),
+            valid_mask[candidate_index_array].tolist())):
+        subbatch = subbatch_index_map.get((x, y), 0)
+        if job_size_map.get(
+                (x, y, subbatch, epsg), 0) > MAX_WATERSHEDS_PER_JOB:
+            subbatch += 1
+            subbatch_index_map[(x, y)] = subbatch
+        subbatch_array[candidate_index] = subbatch
+        if valid:
+            job_key = (x, y, subbatch, epsg)
+            job_size_map[job_key] = job_size_map.get(job_key, 0) + 1
+
+    batch_mask = valid_mask[candidate_index_array]
+    batch_index_array = candidate_index_array[batch_mask]
+    if batch_index_array.size == 0:
+        return watershed_fid_index
+    group_key_array, group_id_array = numpy.unique(
+        numpy.column_stack((
+            xy_bin_array[batch_mask], subbatch_array[batch_mask],
+            epsg_array[batch_index_array])),
+        axis=0, return_inverse=True)
+    group_id_array = group_id_array.reshape(-1)
+    sort_order = numpy.argsort(group_id_array, kind='stable')
+    sorted_group_id_array = group_id_array[sort_order]
+    job_start_array = numpy.flatnonzero(numpy.concatenate((
+        [True], numpy.diff(sorted_group_id_array) != 0)))
+    job_end_array = numpy.append(
+        job_start_array[1:], sorted_group_id_array.size)
+    sorted_index_array = batch_index_array[sort_order]
+    job_area_array = numpy.add.reduceat(
+        area_array[sorted_index_array], job_start_array)
+
+    for job_start, job_end, job_area in zip(
+            job_start_array, job_end_array, job_area_array):
+        x, y, subbatch, epsg = group_key_array[
+            sorted_group_id_array[job_start]]
+        # keep the epsg in the string because the centroid might lie
+        # on a different boundary
+        job_id = (
+            f'{watershed_basename}_{x}_{y}_{subbatch}_{epsg}', int(epsg))
+        job_index_array = sorted_index_array[job_start:job_end]
+        watershed_fid_index[job_id] = (
+            fid_array[job_index_array].tolist(),
+            bounds_array[job_index_array], job_area)
+    return watershed_fid_index
+
+
 def _batch_into_watershed_subsets(
         watershed_root_dir, degree_separation, done_token_path,
         global_bb, min_watershed_area, watershed_subset=None):
@@ -233,6 +797,10 @@ def _batch_into_watershed_subsets(
     computationally efficient batch to run on a large contiguous area in
     parallel while avoiding batching watersheds that are too small.
 
+    The subset vectors themselves are not created here, the caller
+    schedules ``_create_fid_subset`` for each one so model runs can start
+    on the first subsets while the rest are still being written.
+
     Args:
         watershed_root_dir (str): path to watershed .shp files.
         degree_separation (int): a blocksize number of degrees to coalasce
@@ -249,90 +817,36 @@ def _batch_into_watershed_subsets(
             all watersheds are run.
 
     Returns:
-        list of (job_id, watershed.gpkg) tuples where the job_id is a
-        unique identifier for that subwatershed set and watershed.gpkg is
-        a subset of the original global watershed files.
+        list of (watershed_subset_path, watershed_path, fid_list, epsg,
+        wgs84_bb) tuples sorted by decreasing area where
+        ``watershed_subset_path`` is the path to create the subset of the
+        ``fid_list`` features of ``watershed_path`` projected to ``epsg``
+        and ``wgs84_bb`` is the lat/lng bounding box of those features.
 
     """
-    # ensures we don't have more than 1000 watersheds per job
-    task_graph = taskgraph.TaskGraph(
-        watershed_root_dir, multiprocessing.cpu_count(), 10,
-        taskgraph_name='batch watersheds')
-    watershed_path_area_list = []
+    watershed_subset_dir = os.path.join(
+        watershed_root_dir, 'watershed_subsets')
+    os.makedirs(watershed_subset_dir, exist_ok=True)
+    watershed_job_list = []
     job_id_set = set()
     for watershed_path in glob.glob(
             os.path.join(watershed_root_dir, '*.shp')):
         LOGGER.debug(f'scheduling {os.path.basename(watershed_path)}')
-        subbatch_job_index_map = collections.defaultdict(int)
-        # lambda describes the FIDs to process per job, the list of lat/lng
-        # bounding boxes for each FID, and the total degree area of the job
-        watershed_fid_index = collections.defaultdict(
-            lambda: [list(), list(), 0])
         watershed_basename = os.path.splitext(
             os.path.basename(watershed_path))[0]
         watershed_ids = None
-        watershed_vector = gdal.OpenEx(watershed_path, gdal.OF_VECTOR)
-        watershed_layer = watershed_vector.GetLayer()
-
         if watershed_subset:
             if watershed_basename not in watershed_subset:
                 continue
             else:
                 # just grab the subset
                 watershed_ids = watershed_subset[watershed_basename]
-                watershed_layer = [
-                    watershed_layer.GetFeature(fid) for fid in watershed_ids]
-
-        # watershed layer is either the layer or a list of features
-        for watershed_feature in watershed_layer:
-            fid = watershed_feature.GetFID()
-            watershed_geom = watershed_feature.GetGeometryRef()
-            watershed_centroid = watershed_geom.Centroid()
-            epsg = geoprocessing.get_utm_zone(
-                watershed_centroid.GetX(), watershed_centroid.GetY())
-            if watershed_geom.Area() > 1 or watershed_ids:
-                # one degree grids or immediates get special treatment
-                job_id = (f'{watershed_basename}_{fid}', epsg)
-                watershed_fid_index[job_id][0] = [fid]
-            else:
-                # clamp into degree_separation squares
-                x, y = [
-                    int(v//degree_separation)*degree_separation for v in (
-                        watershed_centroid.GetX(), watershed_centroid.GetY())]
-                base_job_id = f'{watershed_basename}_{x}_{y}'
-                # keep the epsg in the string because the centroid might lie
-                # on a different boundary
-                job_id = (f'''{base_job_id}_{
-                    subbatch_job_index_map[base_job_id]}_{epsg}''', epsg)
-                if len(watershed_fid_index[job_id][0]) > 1000:
-                    subbatch_job_index_map[base_job_id] += 1
-                    job_id = (f'''{base_job_id}_{
-                        subbatch_job_index_map[base_job_id]}_{epsg}''', epsg)
-                watershed_fid_index[job_id][0].append(fid)
-            watershed_envelope = watershed_geom.GetEnvelope()
-            watershed_bb = [watershed_envelope[i] for i in [0, 2, 1, 3]]
-            if global_bb is not None and (watershed_bb[0] < global_bb[0] or
-                                          watershed_bb[2] > global_bb[2] or
-                                          watershed_bb[1] > global_bb[3] or
-                                          watershed_bb[3] < global_bb[1]):
-                LOGGER.warning(
-                    f'{watershed_bb} is on a dangerous boundary so dropping')
-                watershed_fid_index[job_id][0].pop()
-                continue
-            watershed_fid_index[job_id][1].append(watershed_bb)
-            watershed_fid_index[job_id][2] += watershed_geom.Area()
-
-        watershed_geom = None
-        watershed_feature = None
 
-        watershed_subset_dir = os.path.join(
-            watershed_root_dir, 'watershed_subsets')
-        os.makedirs(watershed_subset_dir, exist_ok=True)
+        watershed_fid_index = _index_watershed_jobs(
+            watershed_path, degree_separation, global_bb, watershed_ids)
 
         for (job_id, epsg), (fid_list, watershed_envelope_list, area) in \
-                sorted(
-                    watershed_fid_index.items(), key=lambda x: x[1][-1],
-                    reverse=True):
+                watershed_fid_index.items():
             if job_id in job_id_set:
                 raise ValueError(f'{job_id} already processed')
             if len(watershed_envelope_list) < 3 and area < min_watershed_area:
@@ -341,31 +855,22 @@ def _batch_into_watershed_subsets(
             job_id_set.add(job_id)
 
             watershed_subset_path = os.path.join(
-                watershed_subset_dir, f'{job_id}_a{area:.3f}.gpkg')
-            if not os.path.exists(watershed_subset_path):
-                task_graph.add_task(
-                    func=_create_fid_subset,
-                    args=(
-                        watershed_path, fid_list, epsg, watershed_subset_path),
-                    target_path_list=[watershed_subset_path],
-                    task_name=job_id)
-            watershed_path_area_list.append(
-                (area, watershed_subset_path))
-
-        watershed_layer = None
-        watershed_vector = None
-
-    task_graph.join()
-    task_graph.close()
-    task_graph = None
-
-    # create a global sorted watershed path list so it's sorted by area overall
+                watershed_subset_dir, f'{job_id}_a{area:.3f}.fgb')
+            watershed_wgs84_bb = [
+                float(watershed_envelope_list[:, 0].min()),
+                float(watershed_envelope_list[:, 1].min()),
+                float(watershed_envelope_list[:, 2].max()),
+                float(watershed_envelope_list[:, 3].max())]
+            watershed_job_list.append(
+                (area, watershed_subset_path, watershed_path, fid_list, epsg,
+                 watershed_wgs84_bb))
+
+    # create a global sorted watershed list so it's sorted by area overall
     # not just by region per area
     with open(done_token_path, 'w') as token_file:
         token_file.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    sorted_watershed_path_list = [
-        path for area, path in sorted(watershed_path_area_list, reverse=True)]
-    return sorted_watershed_path_list
+    watershed_job_list.sort(key=lambda job: job[:2], reverse=True)
+    return [job[1:] for job in watershed_job_list]
 
 
 def _create_fid_subset(
@@ -375,23 +880,35 @@ def _create_fid_subset(
     layer = vector.GetLayer()
     srs = osr.SpatialReference()
     srs.ImportFromEPSG(target_epsg)
-    layer.SetAttributeFilter(
-        f'"FID" in ('
-        f'{", ".join([str(v) for v in fid_list])})')
-    feature_count = layer.GetFeatureCount()
-    gpkg_driver = ogr.GetDriverByName('gpkg')
+    feature_count = len(fid_list)
+    # FlatGeobuf is written as one sequential stream with no transaction log
+    vector_driver = ogr.GetDriverByName('FlatGeobuf')
     unprojected_vector_path = '%s_wgs84%s' % os.path.splitext(
         target_vector_path)
-    subset_vector = gpkg_driver.CreateDataSource(unprojected_vector_path)
-    subset_vector.CopyLayer(
-        layer, os.path.basename(os.path.splitext(target_vector_path)[0]))
-    geoprocessing.reproject_vector(
-        unprojected_vector_path, srs.ExportToWkt(), target_vector_path,
-        driver_name='gpkg', copy_fields=False)
+    subset_vector = vector_driver.CreateDataSource(unprojected_vector_path)
+    # shapefiles report polygon for mixed polygon/multipolygon layers which
+    # FlatGeobuf would reject so leave the geometry type open
+    subset_layer = subset_vector.CreateLayer(
+        os.path.basename(os.path.splitext(target_vector_path)[0]),
+        layer.GetSpatialRef(), ogr.wkbUnknown)
+    subset_layer_defn = subset_layer.GetLayerDefn()
+    # fetch by fid directly rather than evaluating a filter on every feature,
+    # ascending fids make the reads through the base file sequential
+    for fid in sorted(fid_list):
+        feature = layer.GetFeature(fid)
+        subset_feature = ogr.Feature(subset_layer_defn)
+        subset_feature.SetGeometry(feature.GetGeometryRef())
+        subset_layer.CreateFeature(subset_feature)
+    feature = None
+    subset_feature = None
+    subset_layer = None
     subset_vector = None
     layer = None
     vector = None
-    gpkg_driver.DeleteDataSource(unprojected_vector_path)
+    geoprocessing.reproject_vector(
+        unprojected_vector_path, srs.ExportToWkt(), target_vector_path,
+        driver_name='FlatGeobuf', copy_fields=False)
+    vector_driver.DeleteDataSource(unprojected_vector_path)
     target_vector = gdal.OpenEx(target_vector_path, gdal.OF_VECTOR)
     target_layer = target_vector.GetLayer()
     if feature_count != target_layer.GetFeatureCount():
@@ -423,6 +940,8 @@ def _run_sdr(
         keep_intermediate_files=False,
         c_factor_path=None,
         result_suffix=None,
+        watershed_task_list=None,
+        watershed_bb_list=None,
         ):
     """Run SDR component of the pipeline.
 
@@ -457,10 +976,21 @@ def _run_sdr(
         c_factor_path (str): optional, path to c factor that's used for lucodes
             that use the raster
         result_suffix (str): optional, prepended to the global stitch results.
+        watershed_task_list (list): optional, list parallel to
+            `watershed_path_list` of the lists of tasks that must complete
+            before that watershed vector can be used.
+        watershed_bb_list (list): optional, list parallel to
+            `watershed_path_list` of the lat/lng bounding boxes of each
+            watershed vector.
 
     Returns:
         None.
     """
+    if watershed_task_list is None:
+        watershed_task_list = [[]] * len(watershed_path_list)
+    if watershed_bb_list is None:
+        watershed_bb_list = [None] * len(watershed_path_list)
+
     # create intersecting bounding box of input data
     global_wgs84_bb = _calculate_intersecting_bounding_box(
         [dem_path, erosivity_path, erodibility_path, lulc_path,
@@ -469,8 +999,13 @@ def _run_sdr(
     # create global stitch rasters and start workers
     stitch_raster_queue_map = {}
     stitch_worker_list = []
+    # (uncompressed stitch raster, final compressed raster) path pairs
+    stitch_raster_path_list = []
+    open_stitch_raster_list = []
+    # stitch queues are fed by taskgraph worker processes so they need to be
+    # proxied, but the done queue is only used between local threads
     multiprocessing_manager = multiprocessing.Manager()
-    signal_done_queue = multiprocessing_manager.Queue()
+    signal_done_queue = queue.Queue()
     for local_result_path, global_stitch_raster_path in \
             target_stitch_raster_map.items():
         if result_suffix is not None:
@@ -480,35 +1015,57 @@ def _run_sdr(
             local_result_path = (
                 f'%s_{result_suffix}%s' % os.path.splitext(
                     local_result_path))
-        if not os.path.exists(global_stitch_raster_path):
-            LOGGER.info(f'creating {global_stitch_raster_path}')
+        # stitch into an uncompressed raster so overlapping block writes
+        # don't recompress, then compress once when stitching is complete
+        uncompressed_stitch_raster_path = '%s_uncompressed%s' % (
+            os.path.splitext(global_stitch_raster_path))
+        stitch_raster_path_list.append(
+            (uncompressed_stitch_raster_path, global_stitch_raster_path))
+        if (not os.path.exists(uncompressed_stitch_raster_path) and
+                os.path.exists(global_stitch_raster_path)):
+            # the scratch raster is removed after every run, start from the
+            # finished raster so jobs taskgraph skips keep their results
+            LOGGER.info(
+                f'seeding {uncompressed_stitch_raster_path} from '
+                f'{global_stitch_raster_path}')
+            gdal.Translate(
+                uncompressed_stitch_raster_path, global_stitch_raster_path,
+                options=gdal.TranslateOptions(creationOptions=[
+                    'TILED=YES', 'BIGTIFF=YES', 'SPARSE_OK=TRUE',
+                    'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'INTERLEAVE=BAND',
+                    'GEOTIFF_VERSION=1.1']))
+        elif not os.path.exists(uncompressed_stitch_raster_path):
+            LOGGER.info(f'creating {uncompressed_stitch_raster_path}')
             driver = gdal.GetDriverByName('GTiff')
             n_cols = int((global_wgs84_bb[2]-global_wgs84_bb[0])/global_pixel_size_deg)
             n_rows = int((global_wgs84_bb[3]-global_wgs84_bb[1])/global_pixel_size_deg)
             LOGGER.info(f'**** creating raster of size {n_cols} by {n_rows}')
             target_raster = driver.Create(
-                global_stitch_raster_path,
+                uncompressed_stitch_raster_path,
                 n_cols, n_rows, 1,
                 gdal.GDT_Float32,
                 options=(
-                    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=LZW', 'PREDICTOR=2',
-                    'SPARSE_OK=TRUE', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256'))
-            wgs84_srs = osr.SpatialReference()
-            wgs84_srs.ImportFromEPSG(4326)
-            target_raster.SetProjection(wgs84_srs.ExportToWkt())
+                    'TILED=YES', 'BIGTIFF=YES', 'SPARSE_OK=TRUE',
+                    'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'INTERLEAVE=BAND',
+                    'GEOTIFF_VERSION=1.1'))
+            target_raster.SetProjection(osr.SRS_WKT_WGS84_LAT_LONG)
             target_raster.SetGeoTransform(
                 [global_wgs84_bb[0], global_pixel_size_deg, 0,
                  global_wgs84_bb[3], 0, -global_pixel_size_deg])
             target_band = target_raster.GetRasterBand(1)
             target_band.SetNoDataValue(-9999)
             target_raster = None
+        # keep the stitch raster open for the life of the stitcher
+        stitch_raster = gdal.OpenEx(
+            uncompressed_stitch_raster_path, gdal.OF_RASTER | gdal.GA_Update)
+        open_stitch_raster_list.append(stitch_raster)
         stitch_queue = multiprocessing_manager.Queue(N_TO_BUFFER_STITCH*2)
         stitch_thread = threading.Thread(
             target=stitch_worker,
             args=(
-                stitch_queue, global_stitch_raster_path,
+                stitch_queue, uncompressed_stitch_raster_path,
                 len(watershed_path_list),
-                signal_done_queue))
+                signal_done_queue, threading.Lock(), stitch_raster))
         stitch_thread.start()
         stitch_raster_queue_map[local_result_path] = stitch_queue
         stitch_worker_list.append(stitch_thread)
@@ -520,6 +1077,9 @@ def _run_sdr(
     clean_workspace_worker.daemon = True
     clean_workspace_worker.start()
 
+    # the DEM can be a VRT of many tiles so only open it once
+    dem_pixel_size = geoprocessing.get_raster_info(dem_path)['pixel_size']
+
     # Iterate through each watershed subset and run SDR
     # stitch the results of whatever outputs to whatever global output raster.
     for index, watershed_path in enumerate(watershed_path_list):
@@ -530,13 +1090,15 @@ def _run_sdr(
         task_graph.add_task(
             func=_execute_sdr_job,
             args=(
-                global_wgs84_bb, watershed_path, local_workspace_dir,
-                dem_path, erosivity_path, erodibility_path, lulc_path,
+                global_wgs84_bb, watershed_path, watershed_bb_list[index],
+                local_workspace_dir, dem_path, dem_pixel_size,
+                erosivity_path, erodibility_path, lulc_path,
                 biophysical_table_path, usle_c_path, usle_p_path,
                 threshold_flow_accumulation, k_param,
                 sdr_max, ic_0_param, l_cap, target_pixel_size,
                 biophysical_table_lucode_field, stitch_raster_queue_map,
                 result_suffix),
+            dependent_task_list=watershed_task_list[index],
             transient_run=False,
             priority=-index,  # priority in insert order
             task_name=task_name)
@@ -553,12 +1115,27 @@ def _run_sdr(
     signal_done_queue.put(None)
     clean_workspace_worker.join()
 
-    LOGGER.info('all done with SDR -- stitcher terminated')
+    # close the stitch rasters so they're flushed before compressing
+    stitch_raster = None
+    open_stitch_raster_list = None
+
+    LOGGER.info('all done with SDR -- stitcher terminated, compressing')
+    for uncompressed_stitch_raster_path, global_stitch_raster_path in \
+            stitch_raster_path_list:
+        LOGGER.info(f'compressing {global_stitch_raster_path}')
+        gdal.Translate(
+            global_stitch_raster_path, uncompressed_stitch_raster_path,
+            options=gdal.TranslateOptions(creationOptions=[
+                'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=ZSTD', 'PREDICTOR=3',
+                'NUM_THREADS=ALL_CPUS', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+                'INTERLEAVE=BAND', 'GEOTIFF_VERSION=1.1']))
+        os.remove(uncompressed_stitch_raster_path)
 
 
 def _execute_sdr_job(
-        global_wgs84_bb, watersheds_path, local_workspace_dir, dem_path,
-        erosivity_path, erodibility_path, lulc_path, biophysical_table_path,
+        global_wgs84_bb, watersheds_path, watershed_wgs84_bb,
+        local_workspace_dir, dem_path, dem_pixel_size, erosivity_path,
+        erodibility_path, lulc_path, biophysical_table_path,
         usle_c_path, usle_p_path,
         threshold_flow_accumulation, k_param, sdr_max, ic_0_param, l_cap,
         target_pixel_size, biophysical_table_lucode_field,
@@ -569,10 +1146,14 @@ def _execute_sdr_job(
         global_wgs84_bb (list): bounding box to limit run to, if watersheds do
             not fit, then skip
         watersheds_path (str): path to watershed to run model over
+        watershed_wgs84_bb (list): lat/lng bounding box of the watersheds
+            at `watersheds_path` if already known, otherwise None and it
+            is read from the vector
         local_workspace_dir (str): path to local directory
 
         SDR arguments:
             dem_path
+            dem_pixel_size
             erosivity_path
             erodibility_path
             lulc_path
@@ -594,7 +1175,13 @@ def _execute_sdr_job(
     Returns:
         None.
     """
-    if not _watersheds_intersect(global_wgs84_bb, watersheds_path):
+    if watershed_wgs84_bb is not None:
+        watersheds_intersect = _bounding_boxes_intersect(
+            global_wgs84_bb, watershed_wgs84_bb)
+    else:
+        watersheds_intersect = _watersheds_intersect(
+            global_wgs84_bb, watersheds_path)
+    if not watersheds_intersect:
         LOGGER.debug(f'{watersheds_path} does not overlap {global_wgs84_bb}')
         for local_result_path, stitch_queue in stitch_raster_queue_map.items():
             # indicate skipping
@@ -602,8 +1189,6 @@ def _execute_sdr_job(
 
         return
 
-    local_sdr_taskgraph = taskgraph.TaskGraph(local_workspace_dir, -1)
-    dem_pixel_size = geoprocessing.get_raster_info(dem_path)['pixel_size']
     base_raster_path_list = [
         dem_path, erosivity_path, erodibility_path, lulc_path]
     resample_method_list = ['bilinear', 'bilinear', 'bilinear', 'mode']
@@ -623,10 +1208,10 @@ def _execute_sdr_job(
 
     # re-warp stuff we already did
     _warp_raster_stack(
-        local_sdr_taskgraph, base_raster_path_list, warped_raster_path_list,
+        None, base_raster_path_list, warped_raster_path_list,
         resample_method_list, dem_pixel_size, target_pixel_size,
-        lat_lng_bb, osr.SRS_WKT_WGS84_LAT_LONG, watersheds_path)
-    local_sdr_taskgraph.join()
+        lat_lng_bb, osr.SRS_WKT_WGS84_LAT_LONG, watersheds_path,
+        target_projection_wkt)
 
     # clip to lat/lng bounding boxes
     args = {
@@ -647,9 +1232,7 @@ def _execute_sdr_job(
         'l_cap': l_cap,
         'results_suffix': result_suffix,
         'biophysical_table_lucode_field': biophysical_table_lucode_field,
-        'single_outlet': geoprocessing.get_vector_info(
-            watersheds_path)['feature_count'] == 1,
-        'prealigned': True,
+        'single_outlet': watershed_info['feature_count'] == 1,
         'reuse_dem': True,
     }
     sdr_c_factor.execute(args)
@@ -659,8 +1242,8 @@ def _execute_sdr_job(
 
 
 def _execute_ndr_job(
-        global_wgs84_bb, watersheds_path, local_workspace_dir, dem_path,
-        lulc_path,
+        global_wgs84_bb, watersheds_path, watershed_wgs84_bb,
+        local_workspace_dir, dem_path, dem_pixel_size, lulc_path,
         runoff_proxy_path, fertilizer_path, biophysical_table_path,
         threshold_flow_accumulation, k_param, target_pixel_size,
         biophysical_table_lucode_field, stitch_raster_queue_map,
@@ -670,9 +1253,13 @@ def _execute_ndr_job(
         Args:
             global_wgs84_bb (list): global bounding box to test watershed
                 overlap with
+            watershed_wgs84_bb (list): lat/lng bounding box of
+                `watersheds_path` if already known, otherwise None and it
+                is read from the vector
 
         args['workspace_dir'] (string):  path to current workspace
         args['dem_path'] (string): path to digital elevation map raster
+        dem_pixel_size (tuple): pixel size of the raster at `dem_path`
         args['lulc_path'] (string): a path to landcover map raster
         args['runoff_proxy_path'] (string): a path to a runoff proxy raster
         args['watersheds_path'] (string): path to the watershed shapefile
@@ -703,14 +1290,18 @@ def _execute_ndr_job(
             a large sink or the lowest pixel on the edge of the dem.
         result_suffix (str): string to append to NDR files.
     """
-    if not _watersheds_intersect(global_wgs84_bb, watersheds_path):
+    if watershed_wgs84_bb is not None:
+        watersheds_intersect = _bounding_boxes_intersect(
+            global_wgs84_bb, watershed_wgs84_bb)
+    else:
+        watersheds_intersect = _watersheds_intersect(
+            global_wgs84_bb, watersheds_path)
+    if not watersheds_intersect:
         for local_result_path, stitch_queue in stitch_raster_queue_map.items():
             # indicate skipping
             stitch_queue.put((None, 1))
         return
 
-    local_ndr_taskgraph = taskgraph.TaskGraph(local_workspace_dir, -1)
-    dem_pixel_size = geoprocessing.get_raster_info(dem_path)['pixel_size']
     base_raster_path_list = [
         dem_path, runoff_proxy_path, lulc_path, fertilizer_path]
     resample_method_list = ['bilinear', 'bilinear', 'mode', 'bilinear']
@@ -722,20 +1313,16 @@ def _execute_ndr_job(
     watershed_bb = watershed_info['bounding_box']
     lat_lng_bb = geoprocessing.transform_bounding_box(
         watershed_bb, target_projection_wkt, osr.SRS_WKT_WGS84_LAT_LONG)
-    print(lat_lng_bb)
 
     warped_raster_path_list = [
         os.path.join(clipped_data_dir, os.path.basename(path))
         for path in base_raster_path_list]
 
-    print(dem_pixel_size)
-    print(target_pixel_size)
-    sys.exit()
     _warp_raster_stack(
-        local_ndr_taskgraph, base_raster_path_list, warped_raster_path_list,
+        None, base_raster_path_list, warped_raster_path_list,
         resample_method_list, dem_pixel_size, target_pixel_size,
-        lat_lng_bb, osr.SRS_WKT_WGS84_LAT_LONG, watersheds_path)
-    local_ndr_taskgraph.join()
+        lat_lng_bb, osr.SRS_WKT_WGS84_LAT_LONG, watersheds_path,
+        target_projection_wkt)
 
     args = {
         'workspace_dir': local_workspace_dir,
@@ -749,8 +1336,7 @@ def _execute_ndr_job(
         'k_param': k_param,
         'target_pixel_size': (target_pixel_size, -target_pixel_size),
         'target_projection_wkt': target_projection_wkt,
-        'single_outlet': geoprocessing.get_vector_info(
-            watersheds_path)['feature_count'] == 1,
+        'single_outlet': watershed_info['feature_count'] == 1,
         'biophyisical_lucode_fieldname': biophysical_table_lucode_field,
         'crit_len_n': 150.0,
         'prealigned': True,
@@ -773,34 +1359,226 @@ def _clean_workspace_worker(
         stitch_done_queue (queue): will contain directory paths with the
             same directory path appearing `expected_signal_count` times,
             the directory will be removed. Recieving `None` will terminate
-            the process.
+            the process. Pending removals finish before returning.
         keep_intermediate_files (bool): keep intermediate files if true
 
     Returns:
         None
     """
+    def _log_rmtree_error(future):
+        if future.exception() is not None:
+            LOGGER.error(f'error removing workspace: {future.exception()}')
+
     try:
-        count_dict = collections.defaultdict(int)
-        while True:
-            dir_path = stitch_done_queue.get()
-            if dir_path is None:
-                LOGGER.info('recieved None, quitting clean_workspace_worker')
-                return
-            count_dict[dir_path] += 1
-            if count_dict[dir_path] == expected_signal_count:
-                LOGGER.info(
-                    f'removing {dir_path} after {count_dict[dir_path]} '
-                    f'signals')
+        count_dict = {}
+        # removing a workspace is many unlinks, do it in the background so
+        # the done signals keep draining
+        with concurrent.futures.ThreadPoolExecutor(
+                WORKSPACE_RMTREE_WORKERS) as rmtree_executor:
+            while True:
+                dir_path = stitch_done_queue.get()
+                if dir_path is None:
+                    LOGGER.info(
+                        'recieved None, quitting clean_workspace_worker')
+                    return
+                count = count_dict.pop(dir_path, 0) + 1
+                if count < expected_signal_count:
+                    count_dict[dir_path] = count
+                    continue
+                LOGGER.info(f'removing {dir_path} after {count} signals')
                 if not keep_intermediate_files:
-                    shutil.rmtree(dir_path)
-                del count_dict[dir_path]
+                    rmtree_executor.submit(
+                        shutil.rmtree, dir_path).add_done_callback(
+                            _log_rmtree_error)
     except Exception:
         LOGGER.exception('error on clean_workspace_worker')
 
 
+def _wgs84_pixel_area_m2(lat_array, pixel_width_deg, pixel_height_deg):
+    """Area in m^2 of WGS84 pixels centered at the latitudes in `lat_array`.
+
+    Uses the area of the ellipsoid zone between the pixel's top and bottom
+    latitudes scaled by its share of 360 degrees of longitude.
+    """
+    semi_major = 6378137.0
+    semi_minor = 6356752.3142
+    eccentricity = math.sqrt(1 - (semi_minor/semi_major)**2)
+
+    def _zone_area(lat):
+        sin_lat = numpy.sin(numpy.radians(lat))
+        z_minus = 1 - eccentricity*sin_lat
+        z_plus = 1 + eccentricity*sin_lat
+        return numpy.pi * semi_minor**2 * (
+            numpy.log(z_plus/z_minus) / (2*eccentricity) +
+            sin_lat / (z_plus*z_minus))
+
+    return pixel_width_deg / 360 * numpy.abs(
+        _zone_area(lat_array + pixel_height_deg/2) -
+        _zone_area(lat_array - pixel_height_deg/2))
+
+
+def _stitch_rasters_into_open_band(
+        base_raster_path_band_list, target_raster, target_band_id):
+    """Stitch rasters into a band of an already open WGS84 raster.
+
+    Equivalent to ``geoprocessing.stitch_rasters`` with nearest neighbor
+    resampling, ``overlap_algorithm='replace'`` and
+    ``area_weight_m2_to_wgs84=True`` but writes through `target_raster`
+    rather than reopening it, so its block cache is kept between calls.
+
+    It intentionally differs from ``stitch_rasters`` in that:
+
+        * the base raster is warped directly onto the target grid, rather
+          than onto its own grid and then placed with offsets truncated by
+          ``int()``, so edge pixels may be shifted by up to one pixel.
+        * NaN base pixels are never stitched.
+        * if the base raster has no nodata value the area outside its
+          footprint is filled with target nodata by the warp and skipped
+          rather than written into the target.
+
+    Args:
+        base_raster_path_band_list (list): list of (path, band_id) tuples of
+            rasters in a projected meter coordinate system whose values
+            are per pixel quantities.
+        target_raster (gdal.Dataset): raster opened for update in WGS84.
+        target_band_id (int): band in `target_raster` to stitch into.
+
+    Returns:
+        None
+    """
+    target_band = target_raster.GetRasterBand(target_band_id)
+    target_nodata = target_band.GetNoDataValue()
+    target_gt = target_raster.GetGeoTransform()
+    target_projection_wkt = target_raster.GetProjection()
+    for base_raster_path, base_band_id in base_raster_path_band_list:
+        base_info = geoprocessing.get_raster_info(base_raster_path)
+        base_nodata = base_info['nodata'][base_band_id-1]
+        base_pixel_area_m2 = abs(numpy.prod(base_info['pixel_size']))
+        base_wgs84_bb = geoprocessing.transform_bounding_box(
+            base_info['bounding_box'], base_info['projection_wkt'],
+            target_projection_wkt)
+
+        # window of the target grid that covers the base raster
+        x_off = max(0, int(math.floor(
+            (base_wgs84_bb[0]-target_gt[0]) / target_gt[1])))
+        x_end = min(target_raster.RasterXSize, int(math.ceil(
+            (base_wgs84_bb[2]-target_gt[0]) / target_gt[1])))
+        y_off = max(0, int(math.floor(
+            (base_wgs84_bb[3]-target_gt[3]) / target_gt[5])))
+        y_end = min(target_raster.RasterYSize, int(math.ceil(
+            (base_wgs84_bb[1]-target_gt[3]) / target_gt[5])))
+        if x_off >= x_end or y_off >= y_end:
+            LOGGER.warning(f'{base_raster_path} does not overlap target')
+            continue
+        win_xsize = x_end - x_off
+        win_ysize = y_end - y_off
+
+        # a warped VRT only resamples the strips that are read from it
+        warp_kwargs = {}
+        if base_nodata is not None:
+            warp_kwargs['srcNodata'] = base_nodata
+        warped_raster = gdal.Warp(
+            '', base_raster_path, options=gdal.WarpOptions(
+                format='VRT',
+                outputBounds=[
+                    target_gt[0] + x_off*target_gt[1],
+                    target_gt[3] + y_end*target_gt[5],
+                    target_gt[0] + x_end*target_gt[1],
+                    target_gt[3] + y_off*target_gt[5]],
+                width=win_xsize, height=win_ysize,
+                dstSRS=target_projection_wkt, resampleAlg='near',
+                dstNodata=target_nodata, **warp_kwargs))
+        warped_band = warped_raster.GetRasterBand(base_band_id)
+
+        # convert per base pixel values to per wgs84 pixel values
+        lat_array = target_gt[3] + (
+            numpy.arange(y_off, y_end) + 0.5) * target_gt[5]
+        area_scale_array = _wgs84_pixel_area_m2(
+            lat_array, abs(target_gt[1]),
+            abs(target_gt[5])) / base_pixel_area_m2
+
+        for strip_off in range(0, win_ysize, STITCH_STRIP_ROWS):
+            strip_ysize = min(STITCH_STRIP_ROWS, win_ysize-strip_off)
+            base_array = warped_band.ReadAsArray(
+                0, strip_off, win_xsize, strip_ysize)
+            valid_mask = numpy.isfinite(base_array)
+            if target_nodata is not None:
+                valid_mask &= ~numpy.isclose(base_array, target_nodata)
+            if not valid_mask.any():
+                continue
+            target_array = target_band.ReadAsArray(
+                x_off, y_off+strip_off, win_xsize, strip_ysize)
+            target_array[valid_mask] = (
+                base_array * area_scale_array[
+                    strip_off:strip_off+strip_ysize, numpy.newaxis])[
+                        valid_mask]
+            target_band.WriteArray(target_array, x_off, y_off+strip_off)
+        warped_band = None
+        warped_raster = None
+    target_band.FlushCache()
+
+
+class _StitchSubmissionRing:
+    """Write stitch batches in the background of a stitch worker.
+
+    Batches are submitted to a small thread pool so the worker can keep
+    assembling the next batch while the previous one is written. At most
+    ``STITCH_QUEUE_DEPTH`` batches are in flight, ``submit`` blocks when
+    the ring is full. Completed rasters are signaled on
+    `signal_done_queue` once their batch has been written.
+    `target_stitch_raster` is an open dataset that is only touched while
+    holding `stitch_lock`.
+    """
+
+    def __init__(
+            self, target_stitch_raster_path, target_stitch_raster,
+            signal_done_queue, stitch_lock):
+        self._target_stitch_raster_path = target_stitch_raster_path
+        self._target_stitch_raster = target_stitch_raster
+        self._signal_done_queue = signal_done_queue
+        self._stitch_lock = stitch_lock
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self._inflight_semaphore = threading.BoundedSemaphore(
+            STITCH_QUEUE_DEPTH)
+        self._exception = None
+
+    def submit(self, stitch_buffer_list):
+        """Schedule `stitch_buffer_list` to be stitched."""
+        if self._exception is not None:
+            raise self._exception
+        self._inflight_semaphore.acquire()
+        future = self._executor.submit(self._stitch, stitch_buffer_list)
+        future.add_done_callback(self._complete)
+
+    def close(self):
+        """Wait for all submitted batches and raise any error they hit."""
+        self._executor.shutdown(wait=True)
+        if self._exception is not None:
+            raise self._exception
+
+    def _stitch(self, stitch_buffer_list):
+        with self._stitch_lock:
+            _stitch_rasters_into_open_band(
+                stitch_buffer_list, self._target_stitch_raster, 1)
+        return stitch_buffer_list
+
+    def _complete(self, future):
+        self._inflight_semaphore.release()
+        exception = future.exception()
+        if exception is not None:
+            LOGGER.error(
+                f'error stitching into {self._target_stitch_raster_path}: '
+                f'{exception}')
+            self._exception = exception
+            return
+        #  _ is the band number
+        for stitch_path, _ in future.result():
+            self._signal_done_queue.put(os.path.dirname(stitch_path))
+
+
 def stitch_worker(
         rasters_to_stitch_queue, target_stitch_raster_path, n_expected,
-        signal_done_queue):
+        signal_done_queue, stitch_lock=None, target_stitch_raster=None):
     """Update the database with completed work.
 
     Args:
@@ -811,16 +1589,30 @@ def stitch_worker(
         n_expected (int): number of expected stitch signals
         signal_done_queue (queue): as each job is complete the directory path
             to the raster will be passed in to eventually remove.
-
+        stitch_lock (threading.Lock): optional, held while stitching so
+            several workers can share `target_stitch_raster_path`.
+        target_stitch_raster (gdal.Dataset): optional, the raster at
+            `target_stitch_raster_path` opened for update. Workers
+            stitching into the same path must share this dataset and
+            `stitch_lock`. If None the worker opens the raster itself.
 
     Return:
         ``None``
     """
+    if stitch_lock is None:
+        stitch_lock = threading.Lock()
+    if target_stitch_raster is None:
+        target_stitch_raster = gdal.OpenEx(
+            target_stitch_raster_path, gdal.OF_RASTER | gdal.GA_Update)
     try:
         processed_so_far = 0
         n_buffered = 0
-        start_time = time.time()
+        start_time = time.monotonic()
+        last_log_time = start_time
         stitch_buffer_list = []
+        stitch_ring = _StitchSubmissionRing(
+            target_stitch_raster_path, target_stitch_raster,
+            signal_done_queue, stitch_lock)
         LOGGER.info(f'started stitch worker for {target_stitch_raster_path}')
         while True:
             payload = rasters_to_stitch_queue.get()
@@ -834,24 +1626,23 @@ def stitch_worker(
                 LOGGER.info(
                     f'about to stitch {n_buffered} into '
                     f'{target_stitch_raster_path}')
-                geoprocessing.stitch_rasters(
-                    stitch_buffer_list, ['near']*len(stitch_buffer_list),
-                    (target_stitch_raster_path, 1),
-                    area_weight_m2_to_wgs84=True,
-                    overlap_algorithm='replace')
-                #  _ is the band number
-                for stitch_path, _ in stitch_buffer_list:
-                    signal_done_queue.put(os.path.dirname(stitch_path))
+                if stitch_buffer_list:
+                    stitch_ring.submit(stitch_buffer_list)
                 stitch_buffer_list = []
 
             if payload is None:
+                stitch_ring.close()
                 LOGGER.info(f'all done sitching {target_stitch_raster_path}')
                 return
 
             processed_so_far += 1
-            jobs_per_sec = processed_so_far / (time.time() - start_time)
+            now = time.monotonic()
+            if now - last_log_time < STITCH_LOG_INTERVAL:
+                continue
+            last_log_time = now
+            jobs_per_sec = processed_so_far / (now - start_time)
             remaining_time_s = (
-                n_expected / jobs_per_sec)
+                (n_expected - processed_so_far) / jobs_per_sec)
             remaining_time_h = int(remaining_time_s // 3600)
             remaining_time_s -= remaining_time_h * 3600
             remaining_time_m = int(remaining_time_s // 60)
@@ -885,16 +1676,30 @@ def _run_ndr(
         target_stitch_raster_map,
         global_pixel_size_deg,
         keep_intermediate_files=False,
-        result_suffix=None,):
+        result_suffix=None,
+        watershed_task_list=None,
+        watershed_bb_list=None,):
+
+    if watershed_task_list is None:
+        watershed_task_list = [[]] * len(watershed_path_list)
+    if watershed_bb_list is None:
+        watershed_bb_list = [None] * len(watershed_path_list)
 
     # create intersecting bounding box of input data
     global_wgs84_bb = _calculate_intersecting_bounding_box(
         [dem_path, runoff_proxy_path, fertilizer_path, lulc_path])
 
-    stitch_raster_queue_map = {}
+    # each output is stitched by a few workers, each fed by its own queue,
+    # so the NDR jobs spread their results over independent queues. The
+    # workers share one lock per output so more shards only add threads
+    n_stitch_shards = min(N_STITCH_SHARDS, multiprocessing.cpu_count())
+    stitch_raster_queue_map_list = [{} for _ in range(n_stitch_shards)]
     stitch_worker_list = []
+    open_stitch_raster_list = []
+    # the stitch queues are handed to the taskgraph's worker processes so
+    # they must be proxies, the done signals never leave this process
     multiprocessing_manager = multiprocessing.Manager()
-    signal_done_queue = multiprocessing_manager.Queue()
+    signal_done_queue = queue.Queue()
     for local_result_path, global_stitch_raster_path in \
             target_stitch_raster_map.items():
         if result_suffix is not None:
@@ -915,27 +1720,38 @@ def _run_ndr(
                 n_cols, n_rows, 1,
                 gdal.GDT_Float32,
                 options=(
-                    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=LZW',
-                    'SPARSE_OK=TRUE', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256'))
-            wgs84_srs = osr.SpatialReference()
-            wgs84_srs.ImportFromEPSG(4326)
-            target_raster.SetProjection(wgs84_srs.ExportToWkt())
+                    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=ZSTD',
+                    'PREDICTOR=3', 'NUM_THREADS=ALL_CPUS', 'SPARSE_OK=TRUE',
+                    'BLOCKXSIZE=512', 'BLOCKYSIZE=512', 'INTERLEAVE=BAND',
+                    'GEOTIFF_VERSION=1.1'))
+            target_raster.SetProjection(osr.SRS_WKT_WGS84_LAT_LONG)
             target_raster.SetGeoTransform(
                 [global_wgs84_bb[0], global_pixel_size_deg, 0,
                  global_wgs84_bb[3], 0, -global_pixel_size_deg])
             target_band = target_raster.GetRasterBand(1)
             target_band.SetNoDataValue(-9999)
             target_raster = None
-        stitch_queue = multiprocessing_manager.Queue(N_TO_BUFFER_STITCH*2)
-        stitch_thread = threading.Thread(
-            target=stitch_worker,
-            args=(
-                stitch_queue, global_stitch_raster_path,
-                len(watershed_path_list),
-                signal_done_queue))
-        stitch_thread.start()
-        stitch_raster_queue_map[local_result_path] = stitch_queue
-        stitch_worker_list.append(stitch_thread)
+        # the shard workers share one open dataset and only serialize on
+        # the write itself
+        stitch_lock = threading.Lock()
+        stitch_raster = gdal.OpenEx(
+            global_stitch_raster_path, gdal.OF_RASTER | gdal.GA_Update)
+        open_stitch_raster_list.append(stitch_raster)
+        for shard_index, stitch_raster_queue_map in enumerate(
+                stitch_raster_queue_map_list):
+            stitch_queue = multiprocessing_manager.Queue(
+                N_TO_BUFFER_STITCH*2)
+            stitch_thread = threading.Thread(
+                target=stitch_worker,
+                args=(
+                    stitch_queue, global_stitch_raster_path,
+                    len(range(
+                        shard_index, len(watershed_path_list),
+                        n_stitch_shards)),
+                    signal_done_queue, stitch_lock, stitch_raster))
+            stitch_thread.start()
+            stitch_raster_queue_map[local_result_path] = stitch_queue
+            stitch_worker_list.append(stitch_thread)
 
     clean_workspace_worker = threading.Thread(
         target=_clean_workspace_worker,
@@ -945,32 +1761,53 @@ def _run_ndr(
     clean_workspace_worker.daemon = True
     clean_workspace_worker.start()
 
+    # the DEM can be a VRT of many tiles so only open it once
+    dem_pixel_size = geoprocessing.get_raster_info(dem_path)['pixel_size']
+
     # Iterate through each watershed subset and run ndr
     # stitch the results of whatever outputs to whatever global output raster.
+    # Only a window of jobs is scheduled at once so the number of local
+    # workspaces on disk doesn't grow with the number of watersheds.
+    max_inflight_jobs = 2*multiprocessing.cpu_count()
+    inflight_task_list = []
     for index, watershed_path in enumerate(watershed_path_list):
+        while len(inflight_task_list) >= max_inflight_jobs:
+            # free a slot as soon as any job finishes, the jobs are sorted
+            # largest first so waiting on the oldest would idle the pool
+            inflight_task_list = [
+                task for task in inflight_task_list if not task.join(0)]
+            if len(inflight_task_list) >= max_inflight_jobs:
+                time.sleep(INFLIGHT_JOB_POLL_INTERVAL)
         local_workspace_dir = os.path.join(
             workspace_dir, os.path.splitext(
                 os.path.basename(watershed_path))[0])
-        task_graph.add_task(
+        ndr_task = task_graph.add_task(
             func=_execute_ndr_job,
             args=(
-                global_wgs84_bb, watershed_path, local_workspace_dir, dem_path,
-                lulc_path, runoff_proxy_path, fertilizer_path,
+                global_wgs84_bb, watershed_path, watershed_bb_list[index],
+                local_workspace_dir, dem_path, dem_pixel_size, lulc_path,
+                runoff_proxy_path, fertilizer_path,
                 biophysical_table_path,
                 threshold_flow_accumulation, k_param, target_pixel_size,
-                biophysical_table_lucode_field, stitch_raster_queue_map,
+                biophysical_table_lucode_field,
+                stitch_raster_queue_map_list[index % n_stitch_shards],
                 result_suffix),
+            dependent_task_list=watershed_task_list[index],
             transient_run=False,
             priority=-index,  # priority in insert order
             task_name=f'ndr {os.path.basename(local_workspace_dir)}')
+        inflight_task_list.append(ndr_task)
 
     LOGGER.info('wait for ndr jobs to complete')
     task_graph.join()
-    for local_result_path, stitch_queue in stitch_raster_queue_map.items():
-        stitch_queue.put(None)
+    for stitch_raster_queue_map in stitch_raster_queue_map_list:
+        for stitch_queue in stitch_raster_queue_map.values():
+            stitch_queue.put(None)
     LOGGER.info('all done with ndr, waiting for stitcher to terminate')
     for stitch_thread in stitch_worker_list:
         stitch_thread.join()
+    stitch_raster = None
+    open_stitch_raster_list = None
     LOGGER.info(
         'all done with stitching, waiting for workspace worker to terminate')
     signal_done_queue.put(None)
@@ -1052,21 +1889,41 @@ def run_scenario(workspace_dir, default_config, scenario_config, scenario_id, mi
     exclusive_watershed_subset = scenario_config.get(
         scenario_id, 'watershed_subset', fallback=None)
     if exclusive_watershed_subset is not None:
-        exclusive_watershed_subset = eval(exclusive_watershed_subset)
+        exclusive_watershed_subset = ast.literal_eval(
+            exclusive_watershed_subset)
     watershed_subset_task = task_graph.add_task(
         func=_batch_into_watershed_subsets,
         args=(
             scenario_config[scenario_id]['WATERSHEDS'], 4,
             watershed_subset_token_path,
-            eval(scenario_config.get('DEFAULT', 'GLOBAL_BB', fallback='None')),
+            ast.literal_eval(
+                scenario_config.get('DEFAULT', 'GLOBAL_BB', fallback='None')),
             min_watershed_area,
             exclusive_watershed_subset),
         target_path_list=[watershed_subset_token_path],
         store_result=True,
         task_name='watershed subset batch')
-    watershed_subset_list = watershed_subset_task.get()
-
-    task_graph.join()
+    watershed_job_list = watershed_subset_task.get()
+
+    # schedule the subsets rather than waiting on all of them so the model
+    # jobs that depend on the first (largest) subsets can start right away
+    watershed_subset_list = []
+    watershed_subset_task_list = []
+    watershed_bb_list = []
+    for index, (watershed_subset_path, watershed_path, fid_list, epsg,
+                watershed_wgs84_bb) in enumerate(watershed_job_list):
+        watershed_subset_list.append(watershed_subset_path)
+        watershed_bb_list.append(watershed_wgs84_bb)
+        if os.path.exists(watershed_subset_path):
+            watershed_subset_task_list.append([])
+            continue
+        create_subset_task = task_graph.add_task(
+            func=_create_fid_subset,
+            args=(watershed_path, fid_list, epsg, watershed_subset_path),
+            target_path_list=[watershed_subset_path],
+            priority=-index,
+            task_name=os.path.basename(watershed_subset_path))
+        watershed_subset_task_list.append([create_subset_task])
 
     sdr_target_stitch_raster_map = {
         'sed_export.tif': os.path.join(
@@ -1122,7 +1979,9 @@ def run_scenario(workspace_dir, default_config, scenario_config, scenario_id, mi
             global_pixel_size_deg=float(
                 config_section['GLOBAL_PIXEL_SIZE_DEG']),
             keep_intermediate_files=keep_intermediate_files,
-            result_suffix=scenario_id)
+            result_suffix=scenario_id,
+            watershed_task_list=watershed_subset_task_list,
+            watershed_bb_list=watershed_bb_list)
 
     if run_ndr:
         ndr_workspace_dir = os.path.join(workspace_dir, 'ndr_workspace')
@@ -1143,7 +2002,9 @@ def run_scenario(workspace_dir, default_config, scenario_config, scenario_id, mi
             target_stitch_raster_map=ndr_target_stitch_raster_map,
             global_pixel_size_deg=float(config_section['GLOBAL_PIXEL_SIZE_DEG']),
             keep_intermediate_files=keep_intermediate_files,
-            result_suffix=scenario_id)
+            result_suffix=scenario_id,
+            watershed_task_list=watershed_subset_task_list,
+            watershed_bb_list=watershed_bb_list)
     task_graph.join()
     task_graph.close()
 
@@ -1151,13 +2012,21 @@ def run_scenario(workspace_dir, default_config, scenario_config, scenario_id, mi
 def _warp_raster_stack(
         task_graph, base_raster_path_list, warped_raster_path_list,
         resample_method_list, clip_pixel_size, target_pixel_size,
-        clip_bounding_box, clip_projection_wkt, watershed_clip_vector_path):
+        clip_bounding_box, clip_projection_wkt, watershed_clip_vector_path,
+        watershed_projection_wkt=None):
     """Do an align of all the rasters but use a taskgraph to do it.
 
     Arguments are same as geoprocessing.align_and_resize_raster_stack.
 
-    Allow for input rasters to be None.
+    Allow for input rasters to be None. If `task_graph` is None the warps
+    are run synchronously in the calling thread. If
+    `watershed_projection_wkt` is None it is read from
+    `watershed_clip_vector_path`.
     """
+    if watershed_projection_wkt is None:
+        watershed_projection_wkt = geoprocessing.get_vector_info(
+            watershed_clip_vector_path)['projection_wkt']
+    vector_mask_options = {'mask_vector_path': watershed_clip_vector_path}
     for raster_path, warped_raster_path, resample_method in zip(
             base_raster_path_list, warped_raster_path_list,
             resample_method_list):
@@ -1167,52 +2036,133 @@ def _warp_raster_stack(
         # first clip to clip projection
         clipped_raster_path = '%s_clipped%s' % os.path.splitext(
             warped_raster_path)
-        task_graph.add_task(
-            func=geoprocessing.warp_raster,
-            args=(
-                raster_path, clip_pixel_size, clipped_raster_path,
-                resample_method),
-            kwargs={
-                'target_bb': clip_bounding_box,
-                'target_projection_wkt': clip_projection_wkt,
-                'working_dir': working_dir
-            },
-            target_path_list=[clipped_raster_path],
-            task_name=f'clipping {clipped_raster_path}')
+        clip_args = (
+            raster_path, clip_pixel_size, clipped_raster_path,
+            resample_method)
+        clip_kwargs = {
+            'target_bb': clip_bounding_box,
+            'target_projection_wkt': clip_projection_wkt,
+            'working_dir': working_dir,
+            'gdal_warp_options': WARP_GDAL_OPTIONS,
+            'raster_driver_creation_tuple': WARP_RASTER_CREATION_TUPLE,
+        }
 
         # second, warp and mask to vector
-        watershed_projection_wkt = geoprocessing.get_vector_info(
-            watershed_clip_vector_path)['projection_wkt']
+        warp_args = (
+            clipped_raster_path, (target_pixel_size, -target_pixel_size),
+            warped_raster_path, resample_method,)
+        warp_kwargs = {
+            'target_projection_wkt': watershed_projection_wkt,
+            'vector_mask_options': vector_mask_options,
+            'working_dir': working_dir,
+            'gdal_warp_options': WARP_GDAL_OPTIONS,
+            'raster_driver_creation_tuple': WARP_RASTER_CREATION_TUPLE,
+        }
+
+        if task_graph is None:
+            geoprocessing.warp_raster(*clip_args, **clip_kwargs)
+            geoprocessing.warp_raster(*warp_args, **warp_kwargs)
+            continue
 
-        vector_mask_options = {'mask_vector_path': watershed_clip_vector_path}
+        clip_task = task_graph.add_task(
+            func=geoprocessing.warp_raster,
+            args=clip_args,
+            kwargs=clip_kwargs,
+            target_path_list=[clipped_raster_path],
+            task_name=f'clipping {clipped_raster_path}')
         task_graph.add_task(
             func=geoprocessing.warp_raster,
-            args=(
-                clipped_raster_path, (target_pixel_size, -target_pixel_size),
-                warped_raster_path, resample_method,),
-            kwargs={
-                'target_projection_wkt': watershed_projection_wkt,
-                'vector_mask_options': vector_mask_options,
-                'working_dir': working_dir,
-            },
+            args=warp_args,
+            kwargs=warp_kwargs,
             target_path_list=[warped_raster_path],
+            dependent_task_list=[clip_task],
             task_name=f'warping {warped_raster_path}')
 
 
-def _calculate_intersecting_bounding_box(raster_path_list):
-    # create intersecting bounding box of input data
-    raster_info_list = [
-        geoprocessing.get_raster_info(raster_path)
-        for raster_path in raster_path_list
-        if raster_path is not None and
-        geoprocessing.get_raster_info(raster_path)['projection_wkt']
-        is not None]
+def _transformation_to_wgs84(base_projection_wkt):
+    """Cached transformation from `base_projection_wkt` to WGS84 lat/lng.
 
+    osr.CoordinateTransformation isn't thread-safe so each thread keeps
+    its own cache.
+    """
+    try:
+        cached_builder = _THREAD_LOCAL_STATE.transformation_to_wgs84
+    except AttributeError:
+        cached_builder = functools.lru_cache(maxsize=32)(
+            _build_transformation_to_wgs84)
+        _THREAD_LOCAL_STATE.transformation_to_wgs84 = cached_builder
+    return cached_builder(base_projection_wkt)
+
+
+def _build_transformation_to_wgs84(base_projection_wkt):
+    """Transformation from `base_projection_wkt` to WGS84 lat/lng."""
+    base_srs = osr.SpatialReference()
+    base_srs.ImportFromWkt(base_projection_wkt)
+    base_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    wgs84_srs = osr.SpatialReference()
+    wgs84_srs.ImportFromWkt(osr.SRS_WKT_WGS84_LAT_LONG)
+    wgs84_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return osr.CoordinateTransformation(base_srs, wgs84_srs)
+
+
+def _transform_bounding_box_to_wgs84(
+        bounding_box, base_projection_wkt, edge_samples=11):
+    """Transform `bounding_box` to WGS84 lat/lng.
+
+    Same result as geoprocessing.transform_bounding_box, each edge is
+    sampled at `edge_samples` points, reduced to its extreme and the
+    extremes re-sorted in case the transform flipped them, but the PROJ
+    transformation is only built once per projection and thread.
+
+    Args:
+        bounding_box (list): [min_x, min_y, max_x, max_y] in
+            `base_projection_wkt` coordinates.
+        base_projection_wkt (str): projection of `bounding_box`.
+        edge_samples (int): number of points sampled along each edge.
+
+    Returns:
+        [min_lng, min_lat, max_lng, max_lat] list.
+    """
+    transformation = _transformation_to_wgs84(base_projection_wkt)
+    min_x, min_y, max_x, max_y = bounding_box
+    x_samples = numpy.linspace(min_x, max_x, edge_samples).tolist()
+    y_samples = numpy.linspace(min_y, max_y, edge_samples).tolist()
+    left, bottom, right, top = [
+        numpy.array(transformation.TransformPoints(edge_point_list))
+        for edge_point_list in [
+            [(min_x, y) for y in y_samples],
+            [(x, min_y) for x in x_samples],
+            [(max_x, y) for y in y_samples],
+            [(x, max_y) for x in x_samples]]]
+    # a tight transform can flip the sampled edges, so sort them back
+    min_lng, max_lng = sorted(
+        [float(left[:, 0].min()), float(right[:, 0].max())])
+    min_lat, max_lat = sorted(
+        [float(bottom[:, 1].min()), float(top[:, 1].max())])
+    transformed_bounding_box = [min_lng, min_lat, max_lng, max_lat]
+    if not numpy.isfinite(transformed_bounding_box).all():
+        raise ValueError(
+            f'could not transform {bounding_box} to WGS84, got '
+            f'{transformed_bounding_box}')
+    return transformed_bounding_box
+
+
+def _calculate_intersecting_bounding_box(raster_path_list):
+    # create intersecting bounding box of input data, the opens are mostly
+    # waiting on (possibly remote) metadata reads so overlap them
+    raster_path_list = [path for path in raster_path_list if path is not None]
+    with concurrent.futures.ThreadPoolExecutor(
+            max(1, min(8, len(raster_path_list)))) as executor:
+        raster_info_list = [
+            raster_info for raster_info in executor.map(
+                geoprocessing.get_raster_info, raster_path_list)
+            if raster_info['projection_wkt'] is not None]
+
+    # the transforms are cheap, run them here so this thread's cached PROJ
+    # transformations are reused by later runs and scenarios
     raster_bounding_box_list = [
-        geoprocessing.transform_bounding_box(
-            info['bounding_box'],
-            info['projection_wkt'],
-            osr.SRS_WKT_WGS84_LAT_LONG)
+        _transform_bounding_box_to_wgs84(
+            info['bounding_box'], info['projection_wkt'])
         for info in raster_info_list]
 
     target_bounding_box = geoprocessing.merge_bounding_box_list(
@@ -1221,21 +2171,25 @@ def _calculate_intersecting_bounding_box(raster_path_list):
     return target_bounding_box
 
 
+def _bounding_boxes_intersect(bounding_box_a, bounding_box_b):
+    """True if the two [min_x, min_y, max_x, max_y] boxes overlap."""
+    return not (
+        bounding_box_a[2] < bounding_box_b[0] or
+        bounding_box_b[2] < bounding_box_a[0] or
+        bounding_box_a[3] < bounding_box_b[1] or
+        bounding_box_b[3] < bounding_box_a[1])
+
+
 def _watersheds_intersect(wgs84_bb, watersheds_path):
     """True if watersheds intersect the wgs84 bounding box."""
     watershed_info = geoprocessing.get_vector_info(watersheds_path)
-    watershed_wgs84_bb = geoprocessing.transform_bounding_box(
-        watershed_info['bounding_box'],
-        watershed_info['projection_wkt'],
-        osr.SRS_WKT_WGS84_LAT_LONG)
-    try:
-        _ = geoprocessing.merge_bounding_box_list(
-            [wgs84_bb, watershed_wgs84_bb], 'intersection')
+    watershed_wgs84_bb = _transform_bounding_box_to_wgs84(
+        watershed_info['bounding_box'], watershed_info['projection_wkt'])
+    if _bounding_boxes_intersect(wgs84_bb, watershed_wgs84_bb):
         LOGGER.info(f'{watersheds_path} intersects {wgs84_bb} with {watershed_wgs84_bb}')
         return True
-    except ValueError:
-        LOGGER.warning(f'{watersheds_path} does not intersect {wgs84_bb}')
-        return False
+    LOGGER.warning(f'{watersheds_path} does not intersect {wgs84_bb}')
+    return False
 
 
 if __name__ == '__main__':
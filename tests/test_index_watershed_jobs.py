@@ -0,0 +1,93 @@
+"""Tests for batching watersheds into jobs in run_ndr_sdr_pipeline."""
+import collections
+import math
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('osgeo.gdal')
+pytest.importorskip('ecoshard')
+pytest.importorskip('inspring')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import run_ndr_sdr_pipeline  # noqa: E402
+
+
+def _utm_epsg(lng, lat):
+    """Same utm zone definition as geoprocessing.get_utm_zone."""
+    utm_code = (math.floor((lng + 180)/6) % 60) + 1
+    return (32600 if lat > 0 else 32700) + utm_code
+
+
+def _baseline_index(
+        basename, stats, degree_separation, global_bb, watershed_ids):
+    """Feature by feature batching the vectorized version must match."""
+    subbatch_job_index_map = collections.defaultdict(int)
+    watershed_fid_index = collections.defaultdict(
+        lambda: [list(), list(), 0])
+    for fid, cx, cy, area, bounds in zip(*stats):
+        epsg = _utm_epsg(cx, cy)
+        if area > 1 or watershed_ids:
+            job_id = (f'{basename}_{fid}', epsg)
+            watershed_fid_index[job_id][0] = [fid]
+        else:
+            x, y = [
+                int(v//degree_separation)*degree_separation
+                for v in (cx, cy)]
+            base_job_id = f'{basename}_{x}_{y}'
+            job_id = (f'''{base_job_id}_{
+                subbatch_job_index_map[base_job_id]}_{epsg}''', epsg)
+            if len(watershed_fid_index[job_id][0]) > 1000:
+                subbatch_job_index_map[base_job_id] += 1
+                job_id = (f'''{base_job_id}_{
+                    subbatch_job_index_map[base_job_id]}_{epsg}''', epsg)
+            watershed_fid_index[job_id][0].append(fid)
+        watershed_bb = list(bounds)
+        if global_bb is not None and (
+                watershed_bb[0] < global_bb[0] or
+                watershed_bb[2] > global_bb[2] or
+                watershed_bb[1] > global_bb[3] or
+                watershed_bb[3] < global_bb[1]):
+            watershed_fid_index[job_id][0].pop()
+            continue
+        watershed_fid_index[job_id][1].append(watershed_bb)
+        watershed_fid_index[job_id][2] += area
+    return {
+        job_id: (fid_list, area)
+        for job_id, (fid_list, _, area) in watershed_fid_index.items()
+        if fid_list}
+
+
+@pytest.mark.parametrize('global_bb', [None, [4.0, 0.0, 8.0, 3.9]])
+def test_index_matches_feature_batching(monkeypatch, global_bb):
+    """Jobs straddling a utm zone in one square split like the baseline."""
+    n_watersheds = 5000
+    rng = numpy.random.default_rng(0)
+    # the [4, 8) square straddles the zone boundary at 6 degrees east
+    centroid_x = rng.uniform(4.0, 8.0, n_watersheds)
+    centroid_y = rng.uniform(0.05, 3.95, n_watersheds)
+    area = rng.uniform(0.0, 0.01, n_watersheds)
+    # a few large watersheds get their own job
+    area[::997] = 2.0
+    half_width = rng.uniform(0.0, 0.1, n_watersheds)
+    stats = (
+        numpy.arange(n_watersheds), centroid_x, centroid_y, area,
+        numpy.column_stack((
+            centroid_x - half_width, centroid_y - half_width,
+            centroid_x + half_width, centroid_y + half_width)))
+    monkeypatch.setattr(
+        run_ndr_sdr_pipeline, '_read_watershed_geometry_stats',
+        lambda *args: stats)
+
+    job_index = run_ndr_sdr_pipeline._index_watershed_jobs(
+        'ws.shp', 4, global_bb)
+    expected_index = _baseline_index('ws', stats, 4, global_bb, None)
+
+    assert sorted(job_index) == sorted(expected_index)
+    for job_id, (fid_list, bounds_array, job_area) in job_index.items():
+        expected_fid_list, expected_area = expected_index[job_id]
+        assert fid_list == [int(fid) for fid in expected_fid_list]
+        assert len(bounds_array) == len(fid_list)
+        numpy.testing.assert_allclose(job_area, expected_area)
@@ -0,0 +1,124 @@
+"""Tests for stitching into an open raster in run_ndr_sdr_pipeline."""
+import os
+import sys
+
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+osr = pytest.importorskip('osgeo.osr')
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('ecoshard')
+pytest.importorskip('inspring')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import run_ndr_sdr_pipeline  # noqa: E402
+
+TARGET_NODATA = -9999
+BASE_NODATA = -1
+
+
+def _create_raster(path, array, geotransform, projection_wkt, nodata):
+    """Write `array` to a float32 GeoTIFF at `path`."""
+    n_rows, n_cols = array.shape
+    raster = gdal.GetDriverByName('GTiff').Create(
+        path, n_cols, n_rows, 1, gdal.GDT_Float32)
+    raster.SetGeoTransform(geotransform)
+    raster.SetProjection(projection_wkt)
+    band = raster.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.WriteArray(array)
+    band = None
+    raster = None
+
+
+def _create_base_raster(path):
+    """10km square in UTM 31N around (3E, 10N) with a nodata hole."""
+    utm_srs = osr.SpatialReference()
+    utm_srs.ImportFromEPSG(32631)
+    array = numpy.ones((100, 100), dtype=numpy.float32)
+    array[40:60, 40:60] = BASE_NODATA
+    _create_raster(
+        path, array, [495000, 100, 0, 1110000, 0, -100],
+        utm_srs.ExportToWkt(), BASE_NODATA)
+
+
+def _create_target_raster(path):
+    """Empty WGS84 raster covering the base raster."""
+    _create_raster(
+        path, numpy.full((200, 200), TARGET_NODATA, dtype=numpy.float32),
+        [2.9, 0.001, 0, 10.1, 0, -0.001],
+        osr.SRS_WKT_WGS84_LAT_LONG, TARGET_NODATA)
+
+
+def _read_array(path):
+    """Read band 1 of the raster at `path`."""
+    raster = gdal.OpenEx(path, gdal.OF_RASTER)
+    return raster.GetRasterBand(1).ReadAsArray()
+
+
+def _stitch_into_open_band(base_raster_path, target_raster_path):
+    """Open the target for update and stitch the base raster into it."""
+    target_raster = gdal.OpenEx(
+        target_raster_path, gdal.OF_RASTER | gdal.GA_Update)
+    run_ndr_sdr_pipeline._stitch_rasters_into_open_band(
+        [(base_raster_path, 1)], target_raster, 1)
+    target_raster = None
+
+
+def test_matches_stitch_rasters(tmp_path):
+    """Stitching a projected raster matches geoprocessing.stitch_rasters."""
+    base_raster_path = os.path.join(str(tmp_path), 'base.tif')
+    expected_raster_path = os.path.join(str(tmp_path), 'expected.tif')
+    target_raster_path = os.path.join(str(tmp_path), 'target.tif')
+    _create_base_raster(base_raster_path)
+    _create_target_raster(expected_raster_path)
+    _create_target_raster(target_raster_path)
+
+    run_ndr_sdr_pipeline.geoprocessing.stitch_rasters(
+        [(base_raster_path, 1)], ['near'], (expected_raster_path, 1),
+        area_weight_m2_to_wgs84=True, overlap_algorithm='replace')
+    _stitch_into_open_band(base_raster_path, target_raster_path)
+
+    expected_array = _read_array(expected_raster_path)
+    target_array = _read_array(target_raster_path)
+    expected_valid = expected_array != TARGET_NODATA
+    target_valid = target_array != TARGET_NODATA
+    assert target_valid.any()
+
+    # values only differ by the latitude used for the area of a row
+    both_valid = expected_valid & target_valid
+    numpy.testing.assert_allclose(
+        target_array[both_valid], expected_array[both_valid], rtol=1e-3)
+
+    # stitch_rasters truncates offsets with int() while the open band
+    # stitch aligns to the target grid, so footprint edges (outer and
+    # around the hole) may move by a pixel
+    valid_rows, valid_cols = numpy.nonzero(expected_valid)
+    n_rows = valid_rows.max() - valid_rows.min() + 1
+    n_cols = valid_cols.max() - valid_cols.min() + 1
+    assert numpy.count_nonzero(expected_valid ^ target_valid) <= (
+        4 * (n_rows + n_cols))
+
+    # the hole is in the middle of the base raster and is never stitched
+    center_row = (valid_rows.min() + valid_rows.max()) // 2
+    center_col = (valid_cols.min() + valid_cols.max()) // 2
+    assert not expected_valid[center_row, center_col]
+    assert not target_valid[center_row, center_col]
+
+
+def test_nan_is_not_stitched(tmp_path):
+    """NaN base pixels leave the target untouched."""
+    base_raster_path = os.path.join(str(tmp_path), 'base.tif')
+    target_raster_path = os.path.join(str(tmp_path), 'target.tif')
+    _create_base_raster(base_raster_path)
+    base_raster = gdal.OpenEx(
+        base_raster_path, gdal.OF_RASTER | gdal.GA_Update)
+    base_raster.GetRasterBand(1).WriteArray(
+        numpy.full((100, 100), numpy.nan, dtype=numpy.float32))
+    base_raster = None
+    _create_target_raster(target_raster_path)
+
+    _stitch_into_open_band(base_raster_path, target_raster_path)
+
+    numpy.testing.assert_array_equal(
+        _read_array(target_raster_path), TARGET_NODATA)
@@ -0,0 +1,52 @@
+"""Tests for building the DEM mosaic in run_ndr_sdr_pipeline."""
+import gzip
+import os
+import shutil
+import sys
+
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('ecoshard')
+pytest.importorskip('inspring')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import run_ndr_sdr_pipeline  # noqa: E402
+
+
+def _make_gzipped_dem(dir_path):
+    """Write a small gzipped GeoTIFF DEM, return (path, array)."""
+    tif_path = os.path.join(dir_path, 'dem.tif')
+    array = numpy.arange(64*64, dtype=numpy.float32).reshape((64, 64))
+    raster = gdal.GetDriverByName('GTiff').Create(
+        tif_path, 64, 64, 1, gdal.GDT_Float32)
+    raster.SetGeoTransform([0, 0.1, 0, 0, 0, -0.1])
+    raster.SetProjection(run_ndr_sdr_pipeline.osr.SRS_WKT_WGS84_LAT_LONG)
+    raster.GetRasterBand(1).WriteArray(array)
+    raster = None
+    gz_path = f'{tif_path}.gz'
+    with open(tif_path, 'rb') as tif_file, gzip.open(gz_path, 'wb') as gz:
+        shutil.copyfileobj(tif_file, gz)
+    os.remove(tif_path)
+    return gz_path, array
+
+
+@pytest.mark.parametrize('target_name', ['dem.vrt', 'dem.gti.gpkg'])
+def test_single_tif_gz_dem(tmp_path, target_name):
+    """A lone .tif.gz DEM is mosaicked into a directory that doesn't exist."""
+    if (target_name.endswith('.gti.gpkg') and
+            not run_ndr_sdr_pipeline.GDAL_HAS_GTI):
+        pytest.skip('GDAL does not have the GTI driver')
+    gz_path, array = _make_gzipped_dem(str(tmp_path))
+    # mirrors fetch_and_unpack_data, the unpack dir is named after the dem
+    unpack_dir = os.path.join(str(tmp_path), 'dem.tif')
+    target_path = os.path.join(unpack_dir, target_name)
+
+    run_ndr_sdr_pipeline._unpack_and_vrt_tiles(
+        gz_path, unpack_dir, -9999, target_path)
+
+    raster = gdal.OpenEx(target_path, gdal.OF_RASTER)
+    assert raster is not None
+    numpy.testing.assert_array_equal(
+        raster.GetRasterBand(1).ReadAsArray(), array)